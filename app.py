@@ -1,26 +1,62 @@
-from flask import Flask, request, jsonify, render_template
+from quart import Quart, Response, request, jsonify, render_template
+import aiohttp
+import asyncio
+import atexit
+import copy
 import datetime
-import glob
+import functools
+import hashlib
+import itertools
 import json
 import os
 import logging
-from text_analysis import detect_content, process_text
-from image_content_filter import ImageContentFilter
-from cryptography.fernet import Fernet
+import multiprocessing
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import sys
 
+# Only the pool entry points; image_content_filter is only imported in the workers
+from image_worker import init_worker, analyze_in_worker
+
+# orjson is optional; the stdlib json module is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# text_analysis, image_content_filter and cryptography are imported on first
+# use so that startup and the status/debug routes don't pay for them.
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Initialize Flask app
-app = Flask(__name__)
+# Initialize Quart app
+app = Quart(__name__)
 
 # Configuration
-app.config['DEBUG'] = True
+app.config['DEBUG'] = os.environ.get('SOCIO_DEBUG') == '1'  # debug mode is opt-in
 app.config['SECRET_KEY'] = 'socio-io-secret-key-2025'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['LOG_FOLDER'] = 'logs'
 app.config['ENCRYPTION_KEY_FILE'] = 'encryption_key.key'
+app.config['LOG_BATCH_SIZE'] = 64
+app.config['LOG_FLUSH_INTERVAL'] = 0.2  # seconds
+app.config['DETECTION_CACHE_SIZE'] = 10000
+app.config['RESPONSE_CACHE_SIZE'] = 5000
+app.config['LOG_INDEX_DB'] = os.path.join(app.config['LOG_FOLDER'], 'logs.db')
+app.config['IMAGE_FETCH_TIMEOUT'] = 10  # seconds
+app.config['IMAGE_FETCH_POOL_SIZE'] = 50
+# Image analysis processes per web worker; the cores are split between the
+# web workers (SOCIO_WEB_WORKERS, set by gunicorn_conf.py) unless overridden
+app.config['IMAGE_WORKERS'] = int(os.environ.get(
+    'SOCIO_IMAGE_WORKERS',
+    max(1, (os.cpu_count() or 1) // int(os.environ.get('SOCIO_WEB_WORKERS', 1)))))
+app.config['IMAGE_ANALYSIS_TIMEOUT'] = 30  # seconds
 
 # Ensure directories exist
 for folder in [app.config['UPLOAD_FOLDER'], app.config['LOG_FOLDER']]:
@@ -28,6 +64,8 @@ for folder in [app.config['UPLOAD_FOLDER'], app.config['LOG_FOLDER']]:
 
 # Load or generate encryption key
 def load_encryption_key():
+    from cryptography.fernet import Fernet
+    
     key_file = app.config['ENCRYPTION_KEY_FILE']
     if os.path.exists(key_file):
         with open(key_file, 'rb') as f:
@@ -41,62 +79,425 @@ def load_encryption_key():
     
     return key
 
-# Initialize encryption
-encryption_key = load_encryption_key()
-cipher_suite = Fernet(encryption_key)
+# Initialize encryption on first use
+def get_cipher_suite():
+    """Return the app's Fernet cipher, loading the key on first use"""
+    if not hasattr(app, 'cipher_suite'):
+        from cryptography.fernet import Fernet
+        app.cipher_suite = Fernet(load_encryption_key())
+    return app.cipher_suite
+
+# Background log writer
+# Request handlers only enqueue log entries; a single daemon thread appends
+# them in batches to rolling per-day JSONL files (one JSON object per line)
+# and records their metadata in a SQLite index used by the listing routes.
+_log_queue = queue.Queue()
+
+def log_detection_results(detection_results, action):
+    """Return the detection results to log, with the sensitive matches of encrypted text reduced to counts"""
+    if action != 'encrypt':
+        return detection_results
+    sensitive = detection_results.get('sensitive_info') or {}
+    return {**detection_results, 'sensitive_info': {category: len(items) for category, items in sensitive.items()}}
+
+_LOG_INDEX_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS proc_log(id INTEGER PRIMARY KEY, ts TEXT, action TEXT, summary TEXT, fname TEXT)",
+    "CREATE INDEX IF NOT EXISTS i_proc_ts ON proc_log(ts DESC)",
+    "CREATE TABLE IF NOT EXISTS enc_log(id INTEGER PRIMARY KEY, entry_id TEXT, ts TEXT, fname TEXT, encrypted TEXT)",
+    "CREATE INDEX IF NOT EXISTS i_enc_ts ON enc_log(ts DESC)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS i_enc_entry ON enc_log(entry_id)",
+    "CREATE TABLE IF NOT EXISTS log_meta(key TEXT PRIMARY KEY, value TEXT)",
+)
+
+def init_log_index():
+    """Create the SQLite log index if needed, importing the legacy JSON logs exactly once"""
+    # Workers started without preload_app all run this; the setup is one write
+    # transaction (autocommit mode + BEGIN IMMEDIATE), so the others wait for the
+    # first and then find the import marker
+    db = sqlite3.connect(app.config['LOG_INDEX_DB'], timeout=30, isolation_level=None)
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # An index created before log_meta existed imported the legacy logs on creation
+            existed = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'proc_log'").fetchone() is not None
+            for statement in _LOG_INDEX_SCHEMA:
+                db.execute(statement)
+            if db.execute("SELECT 1 FROM log_meta WHERE key = 'legacy_imported'").fetchone() is None:
+                if not existed:
+                    import_legacy_logs(db)
+                db.execute("INSERT INTO log_meta(key, value) VALUES ('legacy_imported', ?)", (_utc_timestamp(),))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+    finally:
+        db.close()
+
+def import_legacy_logs(db):
+    """Index the one-file-per-entry processing_log_*.json / encryption_log_*.json logs"""
+    # Written before the index existed, with local '%Y%m%d_%H%M%S' timestamps;
+    # a legacy encryption entry is identified by its file name
+    proc_rows = []
+    enc_rows = []
+    with os.scandir(app.config['LOG_FOLDER']) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                if entry.name.startswith('processing_log_'):
+                    with open(entry.path, 'rb') as f:
+                        log = _load_json(f.read())
+                    ts = datetime.datetime.strptime(log['timestamp'], '%Y%m%d_%H%M%S').isoformat()
+                    summary = log_detection_results(log['detection_results'], log['action'])
+                    proc_rows.append((ts, log['action'], _dump_json(summary).decode('utf-8'), entry.name))
+                elif entry.name.startswith('encryption_log_'):
+                    with open(entry.path, 'rb') as f:
+                        log = _load_json(f.read())
+                    ts = datetime.datetime.strptime(log['timestamp'], '%Y%m%d_%H%M%S').isoformat()
+                    enc_rows.append((os.path.splitext(entry.name)[0], ts, entry.name, log['encrypted']))
+            except Exception as e:
+                app.logger.error(f"Error importing legacy log file {entry.name}: {str(e)}")
+    
+    db.executemany("INSERT OR IGNORE INTO proc_log(ts, action, summary, fname) VALUES (?, ?, ?, ?)", proc_rows)
+    db.executemany("INSERT OR IGNORE INTO enc_log(entry_id, ts, fname, encrypted) VALUES (?, ?, ?, ?)", enc_rows)
+    if proc_rows or enc_rows:
+        app.logger.info(f"Imported {len(proc_rows)} processing and {len(enc_rows)} encryption legacy logs into the log index")
+
+def query_log_index(sql, params=()):
+    """Run a read-only query against the SQLite log index"""
+    db = sqlite3.connect(app.config['LOG_INDEX_DB'])
+    try:
+        return db.execute(sql, params).fetchall()
+    finally:
+        db.close()
+
+def _dump_json(obj):
+    """Serialize an object to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def _load_json(data):
+    """Parse JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _log_path(kind, timestamp):
+    """Return the rolling JSONL log file for a kind of log and an ISO timestamp"""
+    return os.path.join(app.config['LOG_FOLDER'], f"{kind}_log_{timestamp[:10].replace('-', '')}.jsonl")
+
+# Log entry ids
+# Second-resolution timestamps collide under concurrent load, so entries are
+# identified by time + pid + a per-process counter instead.
+_seq = itertools.count()
+_seq_lock = threading.Lock()
+
+def _stamp():
+    """Return a unique id for a log entry"""
+    with _seq_lock:
+        n = next(_seq)
+    return f"{int(time.time())}_{os.getpid()}_{n}"
+
+def _utc_timestamp():
+    """Return the current UTC time as an ISO 8601 string"""
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+def _log_file(kind, filename, handles):
+    """Return the open append handle for a kind of log, rolling over when the file changes"""
+    current = handles.get(kind)
+    if current is not None and current.name == filename:
+        return current
+    if current is not None:
+        current.close()
+    handles[kind] = open(filename, 'ab')
+    return handles[kind]
+
+def _write_log_batch(batch, index, handles):
+    """Append a batch of queued log entries, one write per file, then index them"""
+    lines_by_file = {}  # (kind, filename) -> lines
+    proc_rows = []
+    enc_rows = []
+    for kind, log_data in batch:
+        filename = _log_path(kind, log_data['timestamp'])
+        lines_by_file.setdefault((kind, filename), []).append(_dump_json(log_data))
+        
+        if kind == 'processing':
+            proc_rows.append((log_data['timestamp'], log_data['action'],
+                              _dump_json(log_data['detection_results']).decode('utf-8'),
+                              os.path.basename(filename)))
+        elif kind == 'encryption':
+            enc_rows.append((log_data['id'], log_data['timestamp'], os.path.basename(filename), log_data['encrypted']))
+    
+    for (kind, filename), lines in lines_by_file.items():
+        f = _log_file(kind, filename, handles)
+        f.write(b'\n'.join(lines) + b'\n')
+        f.flush()
+    
+    with index:
+        index.executemany("INSERT INTO proc_log(ts, action, summary, fname) VALUES (?, ?, ?, ?)", proc_rows)
+        index.executemany("INSERT INTO enc_log(entry_id, ts, fname, encrypted) VALUES (?, ?, ?, ?)", enc_rows)
+
+def _log_flusher():
+    """Drain the log queue, flushing every LOG_BATCH_SIZE entries or LOG_FLUSH_INTERVAL seconds"""
+    batch_size = app.config['LOG_BATCH_SIZE']
+    flush_interval = app.config['LOG_FLUSH_INTERVAL']
+    index = sqlite3.connect(app.config['LOG_INDEX_DB'])
+    handles = {}  # kind -> long-lived append handle
+    
+    while True:
+        batch = [_log_queue.get()]
+        deadline = time.monotonic() + flush_interval
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_log_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        try:
+            _write_log_batch(batch, index, handles)
+        except Exception as e:
+            app.logger.error(f"Error writing {len(batch)} log entries: {str(e)}")
+        finally:
+            for _ in batch:
+                _log_queue.task_done()
+
+def _start_log_flusher():
+    threading.Thread(target=_log_flusher, name='log-flusher', daemon=True).start()
+
+def _restart_log_flusher_after_fork():
+    """Give a forked worker (e.g. gunicorn with preload_app) its own queue and writer thread"""
+    global _log_queue
+    _log_queue = queue.Queue()
+    _start_log_flusher()
+
+init_log_index()
+_start_log_flusher()
+os.register_at_fork(after_in_child=_restart_log_flusher_after_fork)
+# Flush whatever is still queued before the interpreter exits
+atexit.register(lambda: _log_queue.join())
+
+# Detection result cache
+# Moderation traffic repeats itself (spam, reposts), so detect_content results
+# are kept in an LRU keyed by a blake2b fingerprint of the text.
+_detect_cache = OrderedDict()
+_detect_cache_lock = threading.Lock()
+_detect_cache_stats = {'hits': 0, 'misses': 0}
+
+def _text_key(text):
+    """Return a 16-byte fingerprint of a text"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+def get_detect_content():
+    """Return text_analysis.detect_content, importing the module on first use"""
+    if not hasattr(app, 'detect_content'):
+        from text_analysis import detect_content
+        app.detect_content = detect_content
+    return app.detect_content
+
+def cached_detect_content(text, key=None):
+    """Run detect_content, reusing the result if the same text was seen recently"""
+    key = key or _text_key(text)
+    
+    with _detect_cache_lock:
+        if key in _detect_cache:
+            _detect_cache.move_to_end(key)
+            _detect_cache_stats['hits'] += 1
+            return copy.deepcopy(_detect_cache[key])
+        _detect_cache_stats['misses'] += 1
+    
+    detection_results = get_detect_content()(text)
+    
+    with _detect_cache_lock:
+        _detect_cache[key] = copy.deepcopy(detection_results)
+        _detect_cache.move_to_end(key)
+        while len(_detect_cache) > app.config['DETECTION_CACHE_SIZE']:
+            _detect_cache.popitem(last=False)
+    
+    return detection_results
+
+# Shared HTTP session for image downloads
+# One pooled keep-alive session per worker, so repeated fetches from the same
+# hosts reuse connections instead of paying a TCP/TLS handshake each time.
+def get_http_session():
+    """Return the app's aiohttp session, creating it on first use"""
+    if not hasattr(app, 'http_session'):
+        app.http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=app.config['IMAGE_FETCH_POOL_SIZE']),
+            timeout=aiohttp.ClientTimeout(total=app.config['IMAGE_FETCH_TIMEOUT']),
+            headers={
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            })
+    return app.http_session
+
+@app.after_serving
+async def close_http_session():
+    if hasattr(app, 'http_session'):
+        await app.http_session.close()
+
+# Image analysis worker pool
+# Image analysis is CPU-bound (decode, blur, JPEG encode), so it runs in a pool
+# of processes, each owning its own ImageContentFilter, instead of holding the GIL.
+def start_image_pool():
+    """Start the image analysis process pool"""
+    # spawn rather than fork: the parent has running threads and an event loop
+    return ProcessPoolExecutor(max_workers=app.config['IMAGE_WORKERS'],
+                               mp_context=multiprocessing.get_context('spawn'),
+                               initializer=init_worker)
+
+@app.after_serving
+async def stop_image_pool():
+    if hasattr(app, 'image_pool'):
+        app.image_pool.shutdown(wait=False, cancel_futures=True)
+
+async def fetch_image(image_url):
+    """Download an image over the shared HTTP session and return its bytes"""
+    async with get_http_session().get(image_url) as response:
+        response.raise_for_status()
+        
+        # Check if the content is actually an image
+        content_type = response.headers.get('Content-Type', '')
+        if not content_type.startswith('image/'):
+            app.logger.warning(f"URL does not point to an image. Content-Type: {content_type}")
+            # Try to proceed anyway, it might still be an image
+        
+        return await response.read()
+
+def count_log_files():
+    """Count the JSON/JSONL log files in the log folder with a single directory scan"""
+    with os.scandir(app.config['LOG_FOLDER']) as entries:
+        return sum(1 for entry in entries if entry.name.endswith(('.json', '.jsonl')))
+
+# /analyze_text response cache
+# The extension re-sends the same text on scroll/DOM updates. Recent responses
+# are kept by text fingerprint and served with an ETag, so repeats skip
+# detection, processing and logging (or get a 304 if the client sends
+# If-None-Match). Only touched from the event loop, so no lock is needed.
+_response_cache = OrderedDict()
+
+def _cache_response(key, response_data):
+    """Remember the /analyze_text response for a text fingerprint"""
+    _response_cache[key] = response_data
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > app.config['RESPONSE_CACHE_SIZE']:
+        _response_cache.popitem(last=False)
 
 # Helper functions
 def save_processing_log(text, processed_text, detection_results, encryption_log, action):
-    """Save processing log to file"""
-    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = os.path.join(app.config['LOG_FOLDER'], f"processing_log_{timestamp}.json")
+    """Queue a processing log entry and return the file it will be written to"""
+    timestamp = _utc_timestamp()
     
     log_data = {
+        'id': _stamp(),
         'timestamp': timestamp,
-        'original': text,
+        # Encrypted content is only kept as ciphertext (see save_encryption_log),
+        # so neither the text nor its matched sensitive values are logged
+        'original': None if action == 'encrypt' else text,
         'processed': processed_text,
-        'detection_results': detection_results,
+        'detection_results': log_detection_results(detection_results, action),
         'encryption_log': encryption_log,
         'action': action
     }
     
-    # Ensure directory exists
-    os.makedirs(app.config['LOG_FOLDER'], exist_ok=True)
-    
-    with open(filename, 'w') as f:
-        json.dump(log_data, f, indent=2)
+    _log_queue.put(('processing', log_data))
         
-    return filename
+    return _log_path('processing', timestamp)
 
-def save_encryption_log(original_text, encrypted_text):
-    """Save encryption log to file"""
-    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = os.path.join(app.config['LOG_FOLDER'], f"encryption_log_{timestamp}.json")
+def _enqueue_image_log(image_url, page_url, action, reasons, results):
+    """Queue an image analysis log entry"""
+    _log_queue.put(('image', {
+        'id': _stamp(),
+        'timestamp': _utc_timestamp(),
+        'image_url': image_url,
+        'page_url': page_url,
+        'action': action,
+        'reasons': reasons,
+        'analysis': results
+    }))
+
+def save_encryption_log(encrypted_text):
+    """Queue an encryption log entry and return its reference (<file>:<id>)"""
+    timestamp = _utc_timestamp()
+    entry_id = _stamp()
     
+    # Only the ciphertext is stored; the plaintext is recovered by decrypting it
     log_data = {
+        'id': entry_id,
         'timestamp': timestamp,
-        'original': original_text,
         'encrypted': encrypted_text
     }
     
-    with open(filename, 'w') as f:
-        json.dump(log_data, f, indent=2)
+    _log_queue.put(('encryption', log_data))
         
-    return filename
+    # ':' rather than '#', which would turn the id into a URL fragment in ?filename=
+    return f"{os.path.basename(_log_path('encryption', timestamp))}:{entry_id}"
 
-def load_encryption_log(filename):
-    """Load encryption log from file"""
+def load_encrypted_text(reference):
+    """Look up the ciphertext of an encryption log entry by its reference (<file>:<id>)"""
     try:
-        filepath = os.path.join(app.config['LOG_FOLDER'], os.path.basename(filename))
-        if not os.path.exists(filepath):
-            filepath = filename  # Try with the name as provided
-            
-        with open(filepath, 'r') as f:
-            return json.load(f)
+        filename, _, entry_id = reference.partition(':')
+        if not entry_id:
+            # A legacy encryption log file holds a single entry named after the file
+            entry_id = os.path.splitext(os.path.basename(filename))[0]
+        rows = query_log_index("SELECT encrypted FROM enc_log WHERE entry_id = ? AND fname = ?",
+                               (entry_id, os.path.basename(filename)))
+        if rows:
+            return rows[0][0]
+        
+        # The log file is written before the index, so an entry whose index
+        # write failed can still be recovered from it
+        return scan_encryption_log(os.path.basename(filename), entry_id)
     except Exception as e:
         app.logger.error(f"Error loading encryption log: {str(e)}")
         return None
 
+def scan_encryption_log(fname, entry_id):
+    """Find the ciphertext of an encryption log entry in its log file"""
+    path = os.path.join(app.config['LOG_FOLDER'], fname)
+    if not fname.startswith('encryption_log_') or not os.path.exists(path):
+        return None
+    
+    with open(path, 'rb') as f:
+        if fname.endswith('.json'):
+            # Legacy one-entry file
+            return _load_json(f.read()).get('encrypted')
+        
+        needle = entry_id.encode('utf-8')
+        for line in f:
+            if needle in line:
+                log = _load_json(line)
+                if log.get('id') == entry_id:
+                    return log['encrypted']
+    return None
+
+# Human-readable labels for detection categories and image content flags
+@functools.lru_cache(maxsize=1024)
+def _label(flag):
+    """Return the display label for a category/flag, e.g. 'concerning_object:Knife' -> 'Concerning Object: Knife'"""
+    return flag.replace('_', ' ').replace(':', ': ').title()
+
+# Decide what to do with text based on detection results
+def _decide(detection_results):
+    """Return the (action, reasons) for a set of detection results"""
+    hate = detection_results.get("hate_speech")
+    profanity = detection_results.get("profanity")
+    sensitive = detection_results.get("sensitive_info") or {}
+    sensitive_hits = [category for category, items in sensitive.items() if items]
+    
+    action = "remove" if hate or profanity else ("encrypt" if sensitive_hits else "keep")
+    
+    reasons = []
+    if hate:
+        reasons.append("Hate speech detected")
+    if profanity:
+        reasons.append("Profanity detected")
+    reasons.extend(f"{_label(category)} detected" for category in sensitive_hits)
+    
+    return action, reasons
+
 # Process text based on detection results
 def process_text(text, detection_results, action):
     """Process text based on detection and action"""
@@ -106,22 +507,20 @@ def process_text(text, detection_results, action):
         return text, encryption_log
         
     elif action == "remove":
-        # Replace with asterisks
-        processed_text = '*' * len(text)
+        # Replace with a fixed placeholder (the extension renders its own filtered view)
+        processed_text = "[Content removed]"
         return processed_text, encryption_log
         
     elif action == "encrypt":
-        # Encrypt the text
-        encrypted_bytes = cipher_suite.encrypt(text.encode('utf-8'))
-        encrypted_text = encrypted_bytes.decode('utf-8')
+        # Encrypt the text (Fernet tokens are URL-safe base64, so ASCII decoding is enough)
+        encrypted_text = get_cipher_suite().encrypt(text.encode('utf-8')).decode('ascii')
         
         # Save encryption log
         encryption_log = {
-            "original": text,
             "encrypted": encrypted_text
         }
         
-        log_file = save_encryption_log(text, encrypted_text)
+        log_file = save_encryption_log(encrypted_text)
         encryption_log["log_file"] = log_file
         
         # Return placeholder text
@@ -133,34 +532,40 @@ def process_text(text, detection_results, action):
 
 # Basic routes
 @app.route('/')
-def index():
+async def index():
     """Main page"""
-    return render_template('index.html')
+    return await render_template('index.html')
 
-@app.route('/history')
-def history():
-    """Content moderation history"""
-    # Get all processing logs
+def load_history(limit):
+    """Read up to limit processing log entries (all if negative) from the index, newest first"""
     logs = []
-    log_pattern = os.path.join(app.config['LOG_FOLDER'], "processing_log_*.json")
     
-    for filename in sorted(glob.glob(log_pattern), reverse=True):
+    rows = query_log_index("SELECT ts, action, summary FROM proc_log ORDER BY ts DESC, id DESC LIMIT ?", (limit,))
+    for ts, action, summary in rows:
         try:
-            with open(filename, 'r') as f:
-                log = json.load(f)
-                logs.append({
-                    'timestamp': datetime.datetime.strptime(log['timestamp'], '%Y%m%d_%H%M%S').isoformat(),
-                    'action': log['action'],
-                    'detection_summary': log['detection_results']
-                })
+            logs.append({
+                'timestamp': ts,
+                'action': action,
+                'detection_summary': _load_json(summary)
+            })
         except Exception as e:
-            app.logger.error(f"Error loading log file {filename}: {str(e)}")
+            app.logger.error(f"Error reading log entry {ts}: {str(e)}")
+    
+    return logs
+
+@app.route('/history')
+async def history():
+    """Content moderation history"""
+    # Get processing logs from the index, newest first (off the event loop,
+    # the query and parsing grow with the table)
+    limit = request.args.get('limit', -1, type=int)
+    logs = await asyncio.to_thread(load_history, limit)
             
     return jsonify(logs)
 
 # API routes
 @app.route('/api/status', methods=['GET'])
-def api_status():
+async def api_status():
     """API status endpoint"""
     return jsonify({
         'active': True, 
@@ -169,29 +574,36 @@ def api_status():
     })
 
 @app.route('/analyze_text', methods=['POST'])
-def analyze_text():
+async def analyze_text():
     """Analyze text content from the frontend"""
     try:
-        data = request.json
+        data = await request.get_json()
         if not data or 'text' not in data:
             return jsonify({'error': 'No text provided'}), 400
             
         text = data['text']
         url = data.get('url', 'Unknown URL')
+        key = _text_key(text)
+        etag = key.hex()
+        
+        # Serve repeats of a recently analyzed text from the response cache
+        if key in _response_cache:
+            _response_cache.move_to_end(key)
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = jsonify(_response_cache[key])
+            response.set_etag(etag)
+            response.headers['Access-Control-Expose-Headers'] = 'ETag'
+            return response
         
         app.logger.info(f"Analyzing text from {url}: {text[:50]}...")
         
-        # Detect content using our module
-        detection_results = detect_content(text)
-        
-        # Determine action based on detection
-        action = "keep"
-        if detection_results.get("hate_speech", False):
-            action = "remove"
-        elif detection_results.get("profanity", False):
-            action = "remove"
-        elif any(detection_results.get("sensitive_info", {}).values()):
-            action = "encrypt"
+        # Detect content using our module (may call out to Vertex AI)
+        detection_results = await asyncio.to_thread(cached_detect_content, text, key)
+        
+        # Determine action and reasons based on detection
+        action, reasons = _decide(detection_results)
             
         app.logger.info(f"Action determined for text: {action}")
         
@@ -202,25 +614,20 @@ def analyze_text():
         log_filename = save_processing_log(text, processed_text, detection_results, 
                                            encryption_log, action)
         
-        # Prepare response with explanations
-        reasons = []
-        if detection_results.get("hate_speech", False):
-            reasons.append("Hate speech detected")
-        if detection_results.get("profanity", False):
-            reasons.append("Profanity detected")
-            
-        # Add details about sensitive information
-        for category, items in detection_results.get("sensitive_info", {}).items():
-            if items:
-                reasons.append(f"{category.replace('_', ' ').title()} detected")
-        
-        return jsonify({
+        response_data = {
             'original_text': text,
             'processed_text': processed_text,
             'action': action,
             'reasons': reasons,
             'log_file': log_filename
-        })
+        }
+        _cache_response(key, response_data)
+        
+        # The extension reads the ETag to send it back as If-None-Match
+        response = jsonify(response_data)
+        response.set_etag(etag)
+        response.headers['Access-Control-Expose-Headers'] = 'ETag'
+        return response
         
     except Exception as e:
         app.logger.error(f"Error analyzing text: {str(e)}")
@@ -228,10 +635,10 @@ def analyze_text():
 
 
 @app.route('/analyze_image', methods=['POST'])
-def analyze_image():
+async def analyze_image():
     """Analyze image content from the frontend"""
     try:
-        data = request.json
+        data = await request.get_json()
         if not data or 'image_url' not in data:
             return jsonify({'error': 'No image URL provided'}), 400
             
@@ -240,13 +647,13 @@ def analyze_image():
         
         app.logger.info(f"Analyzing image from {page_url}: {image_url}")
         
-        # Initialize the image content filter if not already done
-        if not hasattr(app, 'image_filter'):
+        # Start the image analysis workers if not already done
+        if not hasattr(app, 'image_pool'):
             try:
-                app.image_filter = ImageContentFilter()
-                app.logger.info("Image content filter initialized successfully")
+                app.image_pool = start_image_pool()
+                app.logger.info("Image analysis worker pool started")
             except Exception as e:
-                app.logger.error(f"Error initializing image filter: {str(e)}")
+                app.logger.error(f"Error starting image analysis workers: {str(e)}")
                 # Fallback to mock results if filter initialization fails
                 results = {
                     "overall_safety": "questionable",
@@ -255,9 +662,21 @@ def analyze_image():
                 }
         
         # Use the image filter to analyze the image
+        pool = getattr(app, 'image_pool', None)
         try:
-            # Analyze the image using the image_url
-            analysis_results = app.image_filter.analyze_image(image_url=image_url, show_results=False)
+            # Download the image ourselves (data URLs are decoded by the filter)
+            if image_url.startswith('data:image'):
+                image_source = {'image_url': image_url}
+            else:
+                image_source = {'image_data': await fetch_image(image_url)}
+            
+            # Analyze the image in a worker process (nothing here reads a comparison export)
+            future = pool.submit(analyze_in_worker, **image_source, show_results=False, export_comparison=False)
+            analysis_results = await asyncio.wait_for(asyncio.wrap_future(future),
+                                                      app.config['IMAGE_ANALYSIS_TIMEOUT'])
+            
+            # A worker built its filter (the pool alone doesn't mean it could)
+            app.image_filter_loaded = True
             
             # Extract relevant information from the analysis results
             results = {
@@ -271,6 +690,12 @@ def analyze_image():
             
         except Exception as e:
             app.logger.error(f"Error during image analysis: {str(e)}")
+            if isinstance(e, BrokenProcessPool) and getattr(app, 'image_pool', None) is pool:
+                # A worker died; start a fresh pool on the next request (unless
+                # another request already replaced the broken one)
+                app.__dict__.pop('image_pool', None)
+                app.__dict__.pop('image_filter_loaded', None)
+                pool.shutdown(wait=False, cancel_futures=True)
             # Fallback to mock results if analysis fails
             results = {
                 "overall_safety": "questionable",
@@ -292,24 +717,10 @@ def analyze_image():
         # Prepare reasons
         reasons = []
         for flag in results.get("content_flags", []):
-            reasons.append(f"{flag.replace('_', ' ').replace(':', ': ').title()} detected")
+            reasons.append(f"{_label(flag)} detected")
         
         # Save log
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        log_filename = os.path.join(app.config['LOG_FOLDER'], f"image_log_{timestamp}.json")
-        
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(log_filename), exist_ok=True)
-        
-        with open(log_filename, 'w') as f:
-            json.dump({
-                'timestamp': timestamp,
-                'image_url': image_url,
-                'page_url': page_url,
-                'action': action,
-                'reasons': reasons,
-                'analysis': results
-            }, f, indent=2)
+        _enqueue_image_log(image_url, page_url, action, reasons, results)
         
         return jsonify({
             'image_url': image_url,
@@ -322,26 +733,33 @@ def analyze_image():
         app.logger.error(f"Error analyzing image: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def list_encryption_entries():
+    """List all encryption log entries from the index, newest first"""
+    files = []
+    
+    for entry_id, ts, fname in query_log_index("SELECT entry_id, ts, fname FROM enc_log ORDER BY ts DESC, id DESC"):
+        try:
+            # Legacy entries are referenced by their file name alone, as before the index
+            if entry_id == os.path.splitext(fname)[0]:
+                reference = fname
+            else:
+                reference = f"{fname}:{entry_id}"
+            files.append({
+                'filename': reference,
+                'date': datetime.datetime.fromisoformat(ts).strftime('%Y-%m-%d %H:%M:%S'),
+                'content_type': 'text' if 'text' in reference else 'unknown'
+            })
+        except Exception as e:
+            app.logger.error(f"Error reading encryption entry {ts}: {str(e)}")
+    
+    return files
+
 @app.route('/encryption_files', methods=['GET'])
-def get_encryption_files():
+async def get_encryption_files():
     """Get list of encryption files"""
     try:
-        # Find all encryption log files
-        files = []
-        log_pattern = os.path.join(app.config['LOG_FOLDER'], "encryption_log_*.json")
-        
-        for filename in glob.glob(log_pattern):
-            try:
-                with open(filename, 'r') as f:
-                    data = json.load(f)
-                    
-                files.append({
-                    'filename': os.path.basename(filename),
-                    'date': datetime.datetime.fromtimestamp(os.path.getmtime(filename)).strftime('%Y-%m-%d %H:%M:%S'),
-                    'content_type': 'text' if 'text' in filename else 'unknown'
-                })
-            except Exception as e:
-                app.logger.error(f"Error loading encryption file {filename}: {str(e)}")
+        # List all encryption log entries from the index (off the event loop)
+        files = await asyncio.to_thread(list_encryption_entries)
         
         return jsonify(files)
         
@@ -350,20 +768,26 @@ def get_encryption_files():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/recover_content', methods=['GET'])
-def recover_content():
+async def recover_content():
     """Recover encrypted content"""
     try:
-        filename = request.args.get('filename')
-        if not filename:
-            return jsonify({'error': 'No filename provided'}), 400
-            
-        # Load encryption log
-        encryption_log = load_encryption_log(filename)
-        if not encryption_log:
-            return jsonify({'error': 'Invalid encryption file or file not found'}), 400
+        # The ciphertext can be passed directly or looked up from an encryption log reference
+        encrypted_text = request.args.get('encrypted')
+        if not encrypted_text:
+            filename = request.args.get('filename')
+            if not filename:
+                return jsonify({'error': 'No filename provided'}), 400
+                
+            encrypted_text = await asyncio.to_thread(load_encrypted_text, filename)
+            if not encrypted_text:
+                return jsonify({'error': 'Invalid encryption file or file not found'}), 400
             
         # Recover the content
-        recovered_text = encryption_log.get('original', '')
+        from cryptography.fernet import InvalidToken
+        try:
+            recovered_text = get_cipher_suite().decrypt(encrypted_text.encode('ascii')).decode('utf-8')
+        except (InvalidToken, UnicodeEncodeError):
+            return jsonify({'error': 'Invalid or tampered encrypted content'}), 400
         
         return jsonify({
             'recovered_text': recovered_text
@@ -375,38 +799,41 @@ def recover_content():
 
 # Additional debug endpoints
 @app.route('/debug/info', methods=['GET'])
-def debug_info():
+async def debug_info():
     """Provide debug info about the system"""
     try:
         return jsonify({
             'python_version': sys.version,
             'app_version': '1.0',
             'timestamp': datetime.datetime.now().isoformat(),
-            'log_files': len(glob.glob(os.path.join(app.config['LOG_FOLDER'], "*.json"))),
+            'log_files': count_log_files(),
             'has_encryption_key': os.path.exists(app.config['ENCRYPTION_KEY_FILE']),
-            'image_filter_loaded': hasattr(app, 'image_filter')
+            'image_filter_loaded': getattr(app, 'image_filter_loaded', False),
+            'detection_cache': {
+                'size': len(_detect_cache),
+                'max_size': app.config['DETECTION_CACHE_SIZE'],
+                **_detect_cache_stats
+            },
+            'response_cache': {
+                'size': len(_response_cache),
+                'max_size': app.config['RESPONSE_CACHE_SIZE']
+            }
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/debug/test_detection', methods=['POST'])
-def debug_test_detection():
+async def debug_test_detection():
     """Test text detection without saving logs"""
     try:
-        data = request.json
+        data = await request.get_json()
         if not data or 'text' not in data:
             return jsonify({'error': 'No text provided'}), 400
             
         text = data['text']
-        detection_results = detect_content(text)
+        detection_results = await asyncio.to_thread(cached_detect_content, text)
         
-        action = "keep"
-        if detection_results.get("hate_speech", False):
-            action = "remove"
-        elif detection_results.get("profanity", False):
-            action = "remove"
-        elif any(detection_results.get("sensitive_info", {}).values()):
-            action = "encrypt"
+        action, _ = _decide(detection_results)
         
         return jsonify({
             'text': text,
@@ -418,18 +845,8 @@ def debug_test_detection():
 
 # Initialization and startup
 if __name__ == '__main__':
-    # Log startup info
+    # Log startup info (the image analysis workers start on the first /analyze_image request)
     app.logger.info("Starting Socio.io Content Moderation Backend")
     
-    # Initialize the image content filter
-    try:
-        app.image_filter = ImageContentFilter()
-        app.logger.info("Image content filter initialized successfully")
-    except Exception as e:
-        app.logger.error(f"Error initializing image filter: {str(e)}")
-        app.logger.warning("Image filtering will use fallback mock implementation")
-    
-    app.logger.info("Content filter initialized successfully")
-    
-    # Run the application
-    app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
+    # Run the development server (in production use `gunicorn -c gunicorn_conf.py app:app`)
+    app.run(debug=app.config['DEBUG'], host='127.0.0.1', port=5000, use_reloader=False)
\ No newline at end of file
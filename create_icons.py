@@ -48,10 +48,12 @@ for size in sizes:
                     # Fall back to default font
                     font = ImageFont.load_default()
                     
-            # Draw the letter 'S'
+            # Draw the letter 'S' centered on its bounding box
+            # (draw.textsize/font.getsize were removed in Pillow 10)
             text = "S"
-            text_width, text_height = draw.textsize(text, font=font) if hasattr(draw, 'textsize') else font.getsize(text)
-            text_position = ((size - text_width) // 2, (size - text_height) // 2)
+            left, top, right, bottom = font.getbbox(text)
+            text_width, text_height = right - left, bottom - top
+            text_position = ((size - text_width) // 2 - left, (size - text_height) // 2 - top)
             draw.text(text_position, text, fill=text_color, font=font)
             
         except Exception as e:
@@ -16,6 +16,50 @@ const BATCH_SIZE = 5;
 const BATCH_DELAY = 300;
 const DEBOUNCE_DELAY = 500;
 
+// Remember the last /analyze_text response per text, so repeats are sent with
+// If-None-Match and the backend can answer 304 Not Modified
+const TEXT_ANALYSIS_CACHE_SIZE = 500;
+let textAnalysisCache = new Map();  // text -> { etag, data }, oldest first
+
+// Ask the backend to analyze text, revalidating a remembered response by its ETag
+async function fetchTextAnalysis(text) {
+    const cached = textAnalysisCache.get(text);
+    const headers = {
+        'Content-Type': 'application/json',
+    };
+    if (cached) {
+        headers['If-None-Match'] = cached.etag;
+    }
+    
+    const response = await fetch(`${API_BASE_URL}/analyze_text`, {
+        method: 'POST',
+        headers: headers,
+        body: JSON.stringify({
+            text: text,
+            url: window.location.href
+        })
+    });
+    
+    let data;
+    if (response.status === 304 && cached) {
+        data = cached.data;
+    } else {
+        data = await response.json();
+    }
+    
+    // Keep the entry most recently used
+    const etag = response.headers.get('ETag');
+    textAnalysisCache.delete(text);
+    if (etag && !data.error) {
+        textAnalysisCache.set(text, { etag: etag, data: data });
+        if (textAnalysisCache.size > TEXT_ANALYSIS_CACHE_SIZE) {
+            textAnalysisCache.delete(textAnalysisCache.keys().next().value);
+        }
+    }
+    
+    return data;
+}
+
 // Debug logging
 function debug(message, obj = null) {
     const timestamp = new Date().toISOString();
@@ -526,19 +570,7 @@ async function processTextElement(element) {
         try {
             debug("Sending text to backend");
             
-            const response = await fetch(`${API_BASE_URL}/analyze_text`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    text: text,
-                    url: window.location.href
-                })
-            });
-            
-            // Parse the response
-            const data = await response.json();
+            const data = await fetchTextAnalysis(text);
             
             debug("Text analysis response:", data);
             
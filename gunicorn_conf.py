@@ -0,0 +1,27 @@
+"""
+Gunicorn configuration for the Socio.io backend
+
+Usage:
+    gunicorn -c gunicorn_conf.py app:app
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("SOCIO_BIND", "127.0.0.1:5000")
+
+# app is an ASGI (Quart) application, so each worker runs its own event loop
+# and blocking detection/image work is already handed off to threads; one
+# async worker per core is enough (2*CPU+1 is the rule for sync workers)
+workers = multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Every worker starts its own image analysis process pool, so tell the app how
+# many workers share the cores (it sizes each pool to cpu_count // workers)
+os.environ.setdefault("SOCIO_WEB_WORKERS", str(workers))
+
+# Import the app once in the master and fork workers from it, so the loaded
+# modules are shared copy-on-write instead of importing them in every worker
+preload_app = True
+
+# Image analysis can take a while (download + Vision API round-trip)
+timeout = 60
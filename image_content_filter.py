@@ -4,13 +4,71 @@ import base64
 from dotenv import load_dotenv
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import requests
-import matplotlib.pyplot as plt
 from google.cloud import vision
 import numpy as np
 from IPython.display import display, HTML
 import logging
 import json
+import re
+import string
 import datetime
+import math
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# OpenCV is optional; PIL's GaussianBlur is used when it is not installed
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# orjson is optional; the stdlib json module is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# RE2 is optional; its DFA matcher scans the keyword union in one linear pass
+try:
+    import re2 as _regex
+except ImportError:
+    _regex = re
+
+# The Vision API accepts at most 16 images per batch request
+MAX_BATCH_SIZE = 16
+
+# Number of analysis results kept for repeated images
+RESULT_CACHE_SIZE = 256
+
+# Images with a longer edge than MAX_UPLOAD_EDGE are uploaded as a JPEG
+# shrunk to UPLOAD_EDGE; detection works as well at that resolution
+MAX_UPLOAD_EDGE = 1600
+UPLOAD_EDGE = 1024
+
+# Keep the Vision API connection open through pauses between images; the
+# message sizes stay unlimited (-1) like the stock transport's channel
+_GRPC_CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1)
+]
+
+# Safe search categories reported for every image
+_SAFE_SEARCH_CATEGORIES = ("adult", "violence", "racy", "medical", "spoof")
+
+# (name, score) for each Vision likelihood, indexed by the enum value
+_LIKELIHOOD_TABLE = tuple((likelihood.name, score) for likelihood, score in sorted({
+    vision.Likelihood.UNKNOWN: 0.0,
+    vision.Likelihood.VERY_UNLIKELY: 0.1,
+    vision.Likelihood.UNLIKELY: 0.3,
+    vision.Likelihood.POSSIBLE: 0.5,
+    vision.Likelihood.LIKELY: 0.7,
+    vision.Likelihood.VERY_LIKELY: 0.9
+}.items()))
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,7 +77,123 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Notebook styles for the results tables
+_CSS = """
+<style>
+.results-table {
+    border-collapse: collapse;
+    width: 100%;
+    margin-bottom: 20px;
+}
+.results-table th, .results-table td {
+    border: 1px solid #ddd;
+    padding: 8px;
+    text-align: left;
+}
+.results-table tr:nth-child(even) {
+    background-color: #f2f2f2;
+}
+.results-table th {
+    padding-top: 12px;
+    padding-bottom: 12px;
+    background-color: #4CAF50;
+    color: white;
+}
+.safe { color: green; font-weight: bold; }
+.questionable { color: orange; font-weight: bold; }
+.unsafe { color: red; font-weight: bold; }
+.flag-item { margin: 5px 0; padding: 3px 8px; border-radius: 3px; display: inline-block; margin-right: 5px; }
+.flag-adult { background-color: #ffcccc; }
+.flag-violence { background-color: #ffaaaa; }
+.flag-racy { background-color: #ffd8b1; }
+.flag-text { background-color: #ffffcc; }
+.flag-object { background-color: #e6ccff; }
+</style>
+"""
+
+_OVERVIEW_TABLE = string.Template("""
+<table class="results-table">
+    <tr><th colspan="2">Overview</th></tr>
+    <tr><td>Source</td><td>$source</td></tr>
+    <tr><td>Image Size</td><td>$image_size</td></tr>
+    <tr><td>Overall Safety Rating</td><td class="$safety_class">$safety</td></tr>
+    <tr><td>Recommended Action</td><td class="$safety_class">$action</td></tr>
+""")
+_EXPORT_ROW = string.Template("""
+    <tr><td>Side-by-Side Export</td><td>$export_path</td></tr>
+""")
+_SAFE_SEARCH_HEADER = """
+<table class="results-table">
+    <tr><th>Category</th><th>Rating</th><th>Confidence</th></tr>
+"""
+_SAFE_SEARCH_ROW = string.Template("""
+    <tr><td>$category</td><td class="$cell_class">$likelihood</td><td>$score</td></tr>
+""")
+_FLAGS_HEADER = """
+<table class="results-table">
+    <tr><th>Content Flags</th></tr>
+    <tr><td>
+"""
+_FLAG_ITEM = string.Template('<span class="flag-item $flag_class">$flag</span>')
+_FLAGS_FOOTER = """
+    </td></tr>
+</table>
+"""
+_TEXT_TABLE = string.Template("""
+<table class="results-table">
+    <tr><th>Detected Text</th></tr>
+    <tr><td>$text</td></tr>
+</table>
+""")
+
+def _flag_class(flag):
+    """CSS class for a content flag"""
+    if flag in ("adult", "violence", "racy"):
+        return f"flag-{flag}"
+    elif "text" in flag:
+        return "flag-text"
+    elif "object" in flag:
+        return "flag-object"
+    return ""
+
+def _describe_source(image_path=None, image_url=None, image_data=None):
+    """Describe an image source the way analysis results report it"""
+    if image_path:
+        return f"Local file: {os.path.basename(image_path)}"
+    elif image_url:
+        return "Data URL image" if image_url.startswith('data:image') else f"URL: {image_url}"
+    return "Image data"
+
+def _batch_indexes(items):
+    """Split the indexes of loaded images (not error slots) into Vision API batches"""
+    pending = [index for index, item in enumerate(items) if not isinstance(item, dict)]
+    return [pending[start:start + MAX_BATCH_SIZE] for start in range(0, len(pending), MAX_BATCH_SIZE)]
+
+def _rgb_array(image):
+    """View an image as an RGB array, converting only images in other modes"""
+    return np.asarray(image if image.mode == 'RGB' else image.convert('RGB'))
+
 class ImageContentFilter:
+    # Words flagged in detected text
+    _OFFENSIVE_TERMS = frozenset([
+        "hate", "kill", "attack", "racist", "nazi", "violence",
+        "offensive", "explicit", "suicide", "abuse", "murder",
+        "slur", "profanity", "obscene"
+    ])
+    
+    _WORD_RE = _regex.compile(r"[a-z']+")
+    
+    # Substrings flagged in lowercased label descriptions
+    _CONCERNING_KEYWORDS = frozenset([
+        "weapon", "gun", "knife", "blood", "drug", "alcohol", "cigarette",
+        "smoking", "death", "corpse", "nazi", "hate", "explicit", "nude",
+        "naked", "underwear"
+    ])
+    _CONCERNING_KEYWORDS_RE = _regex.compile("|".join(map(re.escape, sorted(_CONCERNING_KEYWORDS))))
+    
+    # Object names flagged when detected with high confidence
+    _CONCERNING_OBJECTS = frozenset(["Weapon", "Gun", "Knife", "Alcohol", "Cigarette", "Drug"])
+    
     def __init__(self):
         """Initialize the content filter with Google Cloud Vision API"""
         # Load Google Cloud credentials from .env
@@ -34,6 +208,16 @@ class ImageContentFilter:
             "hate_symbols": 0.7
         }
         
+        # Decodes images while their Vision API request is in flight
+        self._decoder = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-decode")
+        
+        # Analysis results by SHA-256 of the image content, least recently used first
+        self._result_cache = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        
+        # Label font for exports, loaded on first use
+        self._font = None
+        
         # Enhanced blur settings (increased intensity)
         self.blur_settings = {
             "unsafe": 30,         # Was 15, now 30 for stronger blur
@@ -50,19 +234,19 @@ class ImageContentFilter:
             # First try to use the environment variable
             credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
             if credentials_path and os.path.exists(credentials_path):
-                self.client = vision.ImageAnnotatorClient.from_service_account_json(credentials_path)
+                self.client = self._create_client(credentials_path)
                 logger.info(f"Using Google Cloud credentials from environment variable: {credentials_path}")
             else:
                 # Fallback to a local path relative to the project
                 local_credentials_path = os.path.join(os.path.dirname(__file__), "google_credentials.json")
                 if os.path.exists(local_credentials_path):
-                    self.client = vision.ImageAnnotatorClient.from_service_account_json(local_credentials_path)
+                    self.client = self._create_client(local_credentials_path)
                     logger.info(f"Using Google Cloud credentials from local file: {local_credentials_path}")
                 else:
                     # Last resort - try the hardcoded path but with a warning
                     fallback_path = "C:/Users/Antriksh Sharma/Documents/project capstone/my-project-92814-457204-c90e6bf83130.json"
                     if os.path.exists(fallback_path):
-                        self.client = vision.ImageAnnotatorClient.from_service_account_json(fallback_path)
+                        self.client = self._create_client(fallback_path)
                         logger.warning(f"Using fallback Google Cloud credentials: {fallback_path}")
                     else:
                         raise FileNotFoundError(f"No valid Google Cloud credentials found. Please set GOOGLE_APPLICATION_CREDENTIALS environment variable.")
@@ -70,15 +254,20 @@ class ImageContentFilter:
             logger.error(f"Error initializing Google Cloud Vision client: {str(e)}")
             raise
         
-        self.offensive_terms = [
-            "hate", "kill", "attack", "racist", "nazi", "violence", 
-            "offensive", "explicit", "suicide", "abuse", "kill", "murder",
-            "slur", "profanity", "obscene"
-        ]
-        
         logger.info("Content filter initialized successfully")
 
-    def analyze_image(self, image_path=None, image_url=None, image_data=None, show_results=True, export_comparison=True):
+    def _create_client(self, credentials_path):
+        """Create a Vision client on a gRPC channel that keeps its connection alive between requests"""
+        transport_class = vision.ImageAnnotatorClient.get_transport_class("grpc")
+        channel = transport_class.create_channel(
+            "vision.googleapis.com:443",
+            credentials_file=credentials_path,
+            options=_GRPC_CHANNEL_OPTIONS
+        )
+        return vision.ImageAnnotatorClient(transport=transport_class(channel=channel))
+
+    def analyze_image(self, image_path=None, image_url=None, image_data=None, show_results=True, export_comparison=True,
+                      fast_mode=False):
         """
         Analyze an image for content filtering using Google Cloud Vision API
     
@@ -88,170 +277,398 @@ class ImageContentFilter:
             image_data (bytes): Raw image data
             show_results (bool): Whether to display visual results
             export_comparison (bool): Whether to export side-by-side comparison
+            fast_mode (bool): Request safe search first and skip the other features
+                when it is conclusive on its own
         
         Returns:
             dict: Analysis results
         """
         try:
             # Load the image based on the provided input
-            if image_path:
-                try:
-                    with open(image_path, 'rb') as image_file:
-                        content = image_file.read()
-                    image = vision.Image(content=content)
-                    display_image = Image.open(io.BytesIO(content))
-                    source = f"Local file: {os.path.basename(image_path)}"
-                    source_filename = os.path.basename(image_path)
-                except FileNotFoundError:
-                    raise ValueError(f"Image file not found: {image_path}")
-                except Exception as e:
-                    raise ValueError(f"Error opening image file: {str(e)}")
-            
-            elif image_url:
-                try:
-                    # Handle data URLs (base64 encoded images)
-                    if image_url.startswith('data:image'):
-                        try:
-                            # Extract the base64 part
-                            content_type, data = image_url.split(',', 1)
-                            # Decode the base64 data
-                            content = base64.b64decode(data)
-                            image = vision.Image(content=content)
-                            display_image = Image.open(io.BytesIO(content))
-                            source = "Data URL image"
-                            source_filename = "data_url_image"
-                        except Exception as e:
-                            logger.error(f"Error processing data URL: {str(e)}")
-                            raise ValueError(f"Error processing data URL image: {str(e)}")
-                    else:
-                        # Regular URL handling
-                        headers = {
-                            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                        }
-                        response = requests.get(image_url, timeout=10, headers=headers)
-                        response.raise_for_status()  # Raise exception for bad HTTP responses
-                        content = response.content
-                        
-                        # Check if the content is actually an image
-                        content_type = response.headers.get('Content-Type', '')
-                        if not content_type.startswith('image/'):
-                            logger.warning(f"URL does not point to an image. Content-Type: {content_type}")
-                            # Try to proceed anyway, it might still be an image
-                        
-                        image = vision.Image(content=content)
-                        display_image = Image.open(io.BytesIO(content))
-                        source = f"URL: {image_url}"
-                        # Extract filename from URL for export
-                        source_filename = os.path.basename(image_url.split('?')[0])  # Remove query parameters
-                        if not source_filename:
-                            source_filename = "downloaded_image"
-                except requests.exceptions.RequestException as e:
-                    logger.error(f"Error downloading image from URL: {str(e)}")
-                    raise ValueError(f"Error downloading image from URL: {str(e)}")
-                except Exception as e:
-                    logger.error(f"Error processing image from URL: {str(e)}")
-                    raise ValueError(f"Error processing image from URL: {str(e)}")
+            content, display_image, source, source_filename = self._load_image(image_path, image_url, image_data)
             
+            # Reuse the analysis of identical image content
+            key = (hashlib.sha256(content).digest(), fast_mode)
+            results = self._get_cached_results(key)
+            if results is not None:
+                logger.info(f"Using cached analysis for {source}")
+                results["source"] = source
             else:
-                raise ValueError("No image provided. Please provide either image_path, image_url, or image_data.")
-        
-            # Create a comprehensive feature list
-            features = [
-                vision.Feature(type_=vision.Feature.Type.SAFE_SEARCH_DETECTION),
-                vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION, max_results=10),
-                vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION),
-                vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION, max_results=10)
-            ]
-        
-            # Perform image annotation
-            request = vision.AnnotateImageRequest(image=image, features=features)
-            response = self.client.annotate_image(request=request)
+                # Decode the pixels in the background while the API call is in flight
+                decoded = self._decoder.submit(display_image.load)
+            
+                # Perform image annotation
+                image = vision.Image(content=self._upload_content(content, display_image))
+                if fast_mode:
+                    response = self._annotate_two_stage(image)
+                else:
+                    response = self._annotate(image, self._features())
+                decoded.result()
+            
+                # Process the response
+                results = self._process_response(response, display_image, source)
+                self._cache_results(key, results)
         
-            # Check if the API returned an error
-            if response.error.message:
-                raise ValueError(f"Google Vision API error: {response.error.message}")
+            return self._complete_analysis(results, display_image, source_filename, show_results, export_comparison)
         
-            # Process the response
-            results = self._process_response(response, display_image, source)
+        except Exception as e:
+            logger.exception(f"Error in image analysis: {str(e)}")
+            raise
+    
+    def analyze_images(self, sources, show_results=False, export_comparison=True):
+        """
+        Analyze several images with batched Google Cloud Vision API requests
+    
+        Args:
+            sources (list): Dicts with the image_path, image_url or image_data keyword
+                accepted by analyze_image
+            show_results (bool): Whether to display visual results
+            export_comparison (bool): Whether to export side-by-side comparisons
         
-            # Create processed image
-            processed_image = self._create_processed_image(display_image, results)
+        Returns:
+            list: Analysis results in the order of sources; an image that could not be
+                loaded or annotated gets a dict with its "source" and the "error" message instead
+        """
+        try:
+            results = [self._try_load_image(source) for source in sources]
             
-            # Display results if requested
-            if show_results:
-                self._display_results(results, display_image, processed_image)
+            # One round-trip per MAX_BATCH_SIZE loaded images
+            for indexes in _batch_indexes(results):
+                chunk = [results[index] for index in indexes]
+                decoded = [self._decoder.submit(display_image.load) for _, display_image, _, _ in chunk]
+                responses = self._annotate_batch(chunk)
+                for future in decoded:
+                    future.result()
+                for index, item, response in zip(indexes, chunk, responses):
+                    results[index] = self._complete_batch_item(item, response, show_results, export_comparison)
             
-            # Export side-by-side comparison if requested
-            if export_comparison:
-                export_path = self._export_side_by_side(display_image, processed_image, results, source_filename)
-                results["export_path"] = export_path
+            return results
         
+        except Exception as e:
+            logger.exception(f"Error in batch image analysis: {str(e)}")
+            raise
+    
+    def analyze_many(self, sources, max_workers=8, show_results=False, export_comparison=True):
+        """
+        Analyze several images concurrently on a thread pool
+        
+        Downloads, batched Vision API requests and side-by-side exports all run on the
+        pool, so network waits and JPEG encoding overlap across images.
+    
+        Args:
+            sources (list): Dicts with the image_path, image_url or image_data keyword
+                accepted by analyze_image
+            max_workers (int): Number of pool threads
+            show_results (bool): Whether to display visual results
+            export_comparison (bool): Whether to export side-by-side comparisons
+        
+        Returns:
+            list: Analysis results in the order of sources, as returned by analyze_images
+        """
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(self._try_load_image, sources))
+                batches = _batch_indexes(results)
+                chunks = [[results[index] for index in indexes] for indexes in batches]
+                
+                for indexes, chunk, responses in zip(batches, chunks, executor.map(self._annotate_batch, chunks)):
+                    for index, item, response in zip(indexes, chunk, responses):
+                        results[index] = self._complete_batch_item(item, response, show_results,
+                                                                   export_comparison, executor)
+                
+                # Wait for the pooled exports
+                for result in results:
+                    if isinstance(result.get("export_path"), Future):
+                        result["export_path"] = result["export_path"].result()
+            
             return results
         
         except Exception as e:
-            logger.exception(f"Error in image analysis: {str(e)}")
+            logger.exception(f"Error in concurrent image analysis: {str(e)}")
             raise
     
+    def _try_load_image(self, source):
+        """Load an image of a batch, returning its error slot instead of raising"""
+        try:
+            return self._load_image(**source)
+        except ValueError as e:
+            logger.error(f"Error loading image for batch analysis: {str(e)}")
+            return {"source": _describe_source(**source), "error": str(e)}
+    
+    def _annotate(self, image, features):
+        """Annotate an image with the given features"""
+        request = vision.AnnotateImageRequest(image=image, features=features)
+        response = self.client.annotate_image(request=request)
+    
+        # Check if the API returned an error
+        if response.error.message:
+            raise ValueError(f"Google Vision API error: {response.error.message}")
+        return response
+    
+    def _annotate_two_stage(self, image):
+        """Annotate with safe search alone, adding the other features only when its scores are ambiguous"""
+        # Safe search is the first of the features
+        features = self._features()
+        response = self._annotate(image, features[:1])
+        
+        # Adult or violence decides a block on its own, and an image is clearly safe only
+        # when every category is VERY_UNLIKELY (UNKNOWN also scores 0.0 but is not a verdict)
+        safe_search = response.safe_search_annotation
+        likelihoods = {category: getattr(safe_search, category) for category in _SAFE_SEARCH_CATEGORIES}
+        scores = {category: _LIKELIHOOD_TABLE[likelihood][1] for category, likelihood in likelihoods.items()}
+        clearly_safe = all(likelihood == vision.Likelihood.VERY_UNLIKELY for likelihood in likelihoods.values())
+        if max(scores["adult"], scores["violence"]) >= 0.9 or clearly_safe:
+            return response
+        
+        full_response = self._annotate(image, features[1:])
+        full_response.safe_search_annotation = safe_search
+        return full_response
+    
+    def _annotate_batch(self, loaded):
+        """Annotate loaded images with a single batch_annotate_images request"""
+        features = self._features()
+        requests_batch = [
+            vision.AnnotateImageRequest(image=vision.Image(content=self._upload_content(content, display_image)),
+                                        features=features)
+            for content, display_image, _, _ in loaded
+        ]
+        return self.client.batch_annotate_images(requests=requests_batch).responses
+    
+    def _complete_batch_item(self, item, response, show_results, export_comparison, executor=None):
+        """Complete the analysis of one image of a batch, or report its API error"""
+        _, display_image, source, source_filename = item
+        if response.error.message:
+            logger.error(f"Google Vision API error for {source}: {response.error.message}")
+            return {"source": source, "error": f"Google Vision API error: {response.error.message}"}
+        results = self._process_response(response, display_image, source)
+        return self._complete_analysis(results, display_image, source_filename, show_results,
+                                       export_comparison, executor)
+    
+    def _load_image(self, image_path=None, image_url=None, image_data=None):
+        """Load the content of an image from a path, URL or raw data, and open it for display"""
+        if image_path:
+            try:
+                with open(image_path, 'rb') as image_file:
+                    content = image_file.read()
+                display_image = Image.open(io.BytesIO(content))
+                source = f"Local file: {os.path.basename(image_path)}"
+                source_filename = os.path.basename(image_path)
+            except FileNotFoundError:
+                raise ValueError(f"Image file not found: {image_path}")
+            except Exception as e:
+                raise ValueError(f"Error opening image file: {str(e)}")
+        
+        elif image_url:
+            try:
+                # Handle data URLs (base64 encoded images)
+                if image_url.startswith('data:image'):
+                    try:
+                        # Extract the base64 part
+                        content_type, data = image_url.split(',', 1)
+                        # Decode the base64 data
+                        content = base64.b64decode(data)
+                        display_image = Image.open(io.BytesIO(content))
+                        source = "Data URL image"
+                        source_filename = "data_url_image"
+                    except Exception as e:
+                        logger.error(f"Error processing data URL: {str(e)}")
+                        raise ValueError(f"Error processing data URL image: {str(e)}")
+                else:
+                    # Regular URL handling
+                    headers = {
+                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+                    }
+                    with requests.get(image_url, stream=True, timeout=10, headers=headers) as response:
+                        response.raise_for_status()  # Raise exception for bad HTTP responses
+                        # Read the body in 100 KiB chunks as it arrives
+                        buffer = bytearray()
+                        for chunk in response.iter_content(chunk_size=100 * 1024):
+                            buffer += chunk
+                    content = bytes(buffer)
+                    
+                    # Check if the content is actually an image
+                    content_type = response.headers.get('Content-Type', '')
+                    if not content_type.startswith('image/'):
+                        logger.warning(f"URL does not point to an image. Content-Type: {content_type}")
+                        # Try to proceed anyway, it might still be an image
+                    
+                    display_image = Image.open(io.BytesIO(content))
+                    source = f"URL: {image_url}"
+                    # Extract filename from URL for export
+                    source_filename = os.path.basename(image_url.split('?')[0])  # Remove query parameters
+                    if not source_filename:
+                        source_filename = "downloaded_image"
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error downloading image from URL: {str(e)}")
+                raise ValueError(f"Error downloading image from URL: {str(e)}")
+            except Exception as e:
+                logger.error(f"Error processing image from URL: {str(e)}")
+                raise ValueError(f"Error processing image from URL: {str(e)}")
+        
+        elif image_data:
+            try:
+                content = image_data
+                display_image = Image.open(io.BytesIO(content))
+                source = "Image data"
+                source_filename = "image_data"
+            except Exception as e:
+                logger.error(f"Error processing image data: {str(e)}")
+                raise ValueError(f"Error processing image data: {str(e)}")
+        
+        else:
+            raise ValueError("No image provided. Please provide either image_path, image_url, or image_data.")
+        
+        return content, display_image, source, source_filename
+    
+    def _upload_content(self, content, display_image):
+        """Shrink oversized images before they are sent to the Vision API"""
+        if max(display_image.size) <= MAX_UPLOAD_EDGE:
+            return content
+        
+        # Decode a separate copy so display_image stays full resolution; draft lets
+        # JPEGs decode straight at a reduced scale
+        upload_image = Image.open(io.BytesIO(content))
+        upload_image.draft('RGB', (UPLOAD_EDGE, UPLOAD_EDGE))
+        upload_image = upload_image.convert('RGB')
+        upload_image.thumbnail((UPLOAD_EDGE, UPLOAD_EDGE))
+        
+        buffer = io.BytesIO()
+        upload_image.save(buffer, 'JPEG', quality=85)
+        return buffer.getvalue()
+    
+    def _get_cached_results(self, key):
+        """Return a copy of the cached analysis results for a content hash, or None"""
+        with self._result_cache_lock:
+            results = self._result_cache.get(key)
+            if results is None:
+                return None
+            self._result_cache.move_to_end(key)
+        return copy.deepcopy(results)
+    
+    def _cache_results(self, key, results):
+        """Cache a copy of analysis results, evicting the least recently used entry when full"""
+        with self._result_cache_lock:
+            self._result_cache[key] = copy.deepcopy(results)
+            self._result_cache.move_to_end(key)
+            if len(self._result_cache) > RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+    
+    def _features(self):
+        """Vision API features requested for every image"""
+        return [
+            vision.Feature(type_=vision.Feature.Type.SAFE_SEARCH_DETECTION),
+            vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION, max_results=10),
+            vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION),
+            vision.Feature(type_=vision.Feature.Type.OBJECT_LOCALIZATION, max_results=10)
+        ]
+    
+    def _complete_analysis(self, results, display_image, source_filename, show_results, export_comparison,
+                           executor=None):
+        """Create the processed image for analysis results and display or export it as requested"""
+        # Create processed image
+        processed_image = self._create_processed_image(display_image, results)
+        
+        # Display results if requested
+        if show_results:
+            self._display_results(results, display_image, processed_image)
+        
+        # Export side-by-side comparison if requested
+        # (on the executor when given, leaving a Future for the caller to resolve)
+        if export_comparison and executor is not None:
+            results["export_path"] = executor.submit(self._export_side_by_side, display_image, processed_image,
+                                                     results, source_filename)
+        elif export_comparison:
+            export_path = self._export_side_by_side(display_image, processed_image, results, source_filename)
+            results["export_path"] = export_path
+    
+        return results
+    
+    def _gaussian_blur(self, image, sigma, scale=1):
+        """Blur an image with a Gaussian of the given standard deviation, optionally at 1/scale resolution"""
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGBA')
+        size = image.size
+        if min(size) < scale:
+            scale = 1
+        
+        if cv2 is None:
+            if scale > 1:
+                small = image.reduce(scale).filter(ImageFilter.GaussianBlur(radius=sigma / scale))
+                return small.resize(size, Image.BILINEAR)
+            return image.filter(ImageFilter.GaussianBlur(radius=sigma))
+        
+        blurred = np.asarray(image)
+        if scale > 1:
+            blurred = cv2.resize(blurred, (size[0] // scale, size[1] // scale), interpolation=cv2.INTER_AREA)
+            sigma = sigma / scale
+        
+        # Three separable box passes approximate the Gaussian at a cost independent of sigma
+        width = int(round(math.sqrt(4 * sigma * sigma + 1))) | 1
+        for _ in range(3):
+            blurred = cv2.blur(blurred, (width, width), borderType=cv2.BORDER_REPLICATE)
+        if scale > 1:
+            blurred = cv2.resize(blurred, size, interpolation=cv2.INTER_LINEAR)
+        return Image.fromarray(blurred)
+    
     def _create_processed_image(self, image, results):
         """Create a processed image based on the analysis results"""
+        # Nothing to blur or draw: reuse the original instead of copying it
+        if results["overall_safety"] == "safe" and not results["detected_objects"]:
+            return image
+        
         processed_image = image.copy()
         
-        # Apply visual indicator based on safety score
-        if results["overall_safety"] == "unsafe":
-            # Apply strong blur for unsafe content
-            processed_image = processed_image.filter(ImageFilter.GaussianBlur(radius=self.blur_settings["unsafe"]))
-        elif results["overall_safety"] == "questionable":
-            # Apply medium blur for questionable content
-            processed_image = processed_image.filter(ImageFilter.GaussianBlur(radius=self.blur_settings["questionable"]))
-        elif results["overall_safety"] == "potentially_concerning":
-            # Apply light blur for minor concerns
-            processed_image = processed_image.filter(ImageFilter.GaussianBlur(radius=self.blur_settings["potentially_concerning"]))
-    
-        # Convert to RGBA if not already (needed for drawing)
-        if processed_image.mode != 'RGBA':
-            processed_image = processed_image.convert('RGBA')
+        # Apply visual indicator based on safety score: strong blur for unsafe,
+        # medium for questionable and light for potentially concerning content.
+        # The unsafe blur runs on a quarter-size copy: the downsample destroys detail
+        # on its own and leaves a sixteenth of the pixels to convolve
+        blur_sigma = self.blur_settings.get(results["overall_safety"])
+        if blur_sigma:
+            scale = 4 if results["overall_safety"] == "unsafe" else 1
+            processed_image = self._gaussian_blur(processed_image, blur_sigma, scale)
+    
+        # Convert to RGB if not already (needed for colored drawing); the exports
+        # and thumbnails have no alpha channel, so none is added
+        if processed_image.mode != 'RGB':
+            processed_image = processed_image.convert('RGB')
     
         draw = ImageDraw.Draw(processed_image)
     
+        # Scale every object's normalized vertices to pixels in one operation
+        objects = results["detected_objects"]
+        vertices = np.array([[v["x"], v["y"]] for obj in objects for v in obj["bounding_box"]],
+                            dtype=np.float64).reshape(-1, 2)
+        vertices *= (image.width, image.height)
+        ends = np.cumsum([len(obj["bounding_box"]) for obj in objects])
+    
+        # Objects flagged as concerning are drawn in red
+        concerning = {flag.split(":", 1)[1] for flag in results["content_flags"]
+                      if flag.startswith("concerning_object:")}
+    
         # Draw detected objects with bounding boxes
-        for obj in results["detected_objects"]:
+        for obj, points in zip(objects, np.split(vertices, ends[:-1])):
             name = obj["name"]
-            vertices = obj["bounding_box"]
-            x_coords = [v["x"] * image.width for v in vertices]
-            y_coords = [v["y"] * image.height for v in vertices]
         
             # Draw rectangle
-            is_concerning = any(f"concerning_object:{name}" in flag for flag in results["content_flags"])
-            color = (255, 0, 0, 180) if is_concerning else (0, 255, 0, 180)
-        
-            # Convert to list of tuples for drawing
-            xy = list(zip(x_coords, y_coords))
-            draw.polygon(xy, outline=color)
+            color = (255, 0, 0) if name in concerning else (0, 255, 0)
+            draw.polygon(points.ravel().tolist(), outline=color)
         
             # Add label at top of bounding box
-            draw.text((min(x_coords), min(y_coords) - 10), name, fill=color)
+            left, top = points.min(axis=0)
+            draw.text((float(left), float(top) - 10), name, fill=color)
             
         return processed_image
     
     def _export_side_by_side(self, original_image, processed_image, results, source_filename):
         """Export original and processed images side by side"""
         try:
-            # Ensure both images have the same mode
-            if original_image.mode != processed_image.mode:
-                original_image = original_image.convert('RGBA')
-                processed_image = processed_image.convert('RGBA')
-            
             # Get dimensions
             width, height = original_image.size
             
-            # Create a new image with double width
-            combined_image = Image.new(original_image.mode, (width * 2, height))
-            
-            # Paste original image on the left
-            combined_image.paste(original_image, (0, 0))
-            
-            # Paste processed image on the right
-            combined_image.paste(processed_image, (width, 0))
+            # Place the original on the left and the processed image on the right in one
+            # RGB allocation (JPEG has no alpha channel to keep)
+            combined = np.concatenate([_rgb_array(original_image), _rgb_array(processed_image)], axis=1)
+            combined_image = Image.fromarray(combined)
             
             # Add a dividing line
             draw = ImageDraw.Draw(combined_image)
@@ -261,11 +678,13 @@ class ImageContentFilter:
             safety_text = results["overall_safety"].upper().replace("_", " ")
             action_text = results["suggested_action"].upper()
             
-            # Try to load a font (fallback to default if not available)
-            try:
-                font = ImageFont.truetype("arial.ttf", 20)
-            except IOError:
-                font = ImageFont.load_default()
+            # Load the font once (fallback to default if not available)
+            if self._font is None:
+                try:
+                    self._font = ImageFont.truetype("arial.ttf", 20)
+                except IOError:
+                    self._font = ImageFont.load_default()
+            font = self._font
             
             # Add safety info text to the right side
             text_position = (width + 10, 10)
@@ -278,10 +697,6 @@ class ImageContentFilter:
             base_name = os.path.splitext(source_filename)[0]
             output_filename = f"{base_name}_analyzed_{timestamp}.jpg"
             
-            # Convert to RGB for JPG export
-            if combined_image.mode == 'RGBA':
-                combined_image = combined_image.convert('RGB')
-                
             # Save the combined image
             combined_image.save(output_filename, 'JPEG', quality=95)
             logger.info(f"Exported side-by-side comparison to {output_filename}")
@@ -309,31 +724,11 @@ class ImageContentFilter:
         # Process Safe Search
         safe_search = response.safe_search_annotation
     
-        # Convert likelihood enum to score
-        likelihood_scores = {
-            vision.Likelihood.UNKNOWN: 0.0,
-            vision.Likelihood.VERY_UNLIKELY: 0.1,
-            vision.Likelihood.UNLIKELY: 0.3,
-            vision.Likelihood.POSSIBLE: 0.5,
-            vision.Likelihood.LIKELY: 0.7,
-            vision.Likelihood.VERY_LIKELY: 0.9
-        }
-    
-        # Get likelihood name properly
-        def get_likelihood_name(likelihood_value):
-            for name, value in vision.Likelihood.__dict__.items():
-                if isinstance(value, int) and value == likelihood_value:
-                    return name
-            return "UNKNOWN"  # Fallback
-    
-        # Process each safe search category
-        safe_search_results = {
-            "adult": {"score": likelihood_scores[safe_search.adult], "likelihood": get_likelihood_name(safe_search.adult)},
-            "violence": {"score": likelihood_scores[safe_search.violence], "likelihood": get_likelihood_name(safe_search.violence)},
-            "racy": {"score": likelihood_scores[safe_search.racy], "likelihood": get_likelihood_name(safe_search.racy)},
-            "medical": {"score": likelihood_scores[safe_search.medical], "likelihood": get_likelihood_name(safe_search.medical)},
-            "spoof": {"score": likelihood_scores[safe_search.spoof], "likelihood": get_likelihood_name(safe_search.spoof)}
-        }
+        # Look up each safe search category's likelihood name and score
+        safe_search_results = {}
+        for category in _SAFE_SEARCH_CATEGORIES:
+            name, score = _LIKELIHOOD_TABLE[getattr(safe_search, category)]
+            safe_search_results[category] = {"score": score, "likelihood": name}
         results["safe_search"] = safe_search_results
     
         # Flag content based on thresholds
@@ -352,14 +747,8 @@ class ImageContentFilter:
         results["labels"] = labels
     
         # Look for potentially concerning labels
-        concerning_keywords = [
-            "weapon", "gun", "knife", "blood", "drug", "alcohol", "cigarette", 
-            "smoking", "death", "corpse", "nazi", "hate", "explicit", "nude", 
-            "naked", "underwear"
-        ]
-    
         for label in labels:
-            if any(keyword in label["description"].lower() for keyword in concerning_keywords) and label["score"] > 0.7:
+            if label["score"] > 0.7 and self._CONCERNING_KEYWORDS_RE.search(label["description"].lower()):
                 results["content_flags"].append(f"concerning_label:{label['description']}")
     
         # Process Text
@@ -368,8 +757,8 @@ class ImageContentFilter:
             results["text_content"] = full_text
         
             # Check for offensive content in text
-            text_lower = full_text.lower()
-            offensive_words_found = [word for word in self.offensive_terms if word in text_lower]
+            words = set(self._WORD_RE.findall(full_text.lower()))
+            offensive_words_found = sorted(words & self._OFFENSIVE_TERMS)
         
             if offensive_words_found:
                 results["content_flags"].append("offensive_text")
@@ -391,9 +780,8 @@ class ImageContentFilter:
         results["detected_objects"] = objects
     
         # Check for potentially concerning objects
-        concerning_objects = ["Weapon", "Gun", "Knife", "Alcohol", "Cigarette", "Drug"]
         for obj in objects:
-            if obj["name"] in concerning_objects and obj["score"] > 0.7:
+            if obj["name"] in self._CONCERNING_OBJECTS and obj["score"] > 0.7:
                 results["content_flags"].append(f"concerning_object:{obj['name']}")
     
         # Determine overall safety
@@ -437,66 +825,33 @@ class ImageContentFilter:
             display_height = original_image.height
             display_width = original_image.width
     
-        # Create figure with subplots
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, display_height/80))
+        # Scale both images down to thumbnails for display
+        display_size = (display_width, display_height)
+        if original_image.size != display_size:
+            original_image = original_image.resize(display_size, Image.BICUBIC, reducing_gap=2.0)
+            processed_image = processed_image.resize(display_size, Image.BICUBIC, reducing_gap=2.0)
     
-        # Display original image
-        ax1.imshow(original_image)
-        ax1.set_title("Original Image")
-        ax1.axis('off')
+        # Display the original and processed images side by side
+        thumbnails = Image.new('RGB', (display_width * 2, display_height), 'white')
+        thumbnails.paste(original_image, (0, 0))
+        thumbnails.paste(processed_image, (display_width, 0))
     
-        # Display processed image with title based on safety score
-        ax2.imshow(processed_image)
+        # Title based on safety score
         if results["overall_safety"] == "unsafe":
-            ax2.set_title("UNSAFE CONTENT DETECTED - BLURRED", color='red', fontweight='bold')
+            title, title_style = "UNSAFE CONTENT DETECTED - BLURRED", "color: red; font-weight: bold"
         elif results["overall_safety"] == "questionable":
-            ax2.set_title("Questionable Content - Blurred", color='orange')
+            title, title_style = "Questionable Content - Blurred", "color: orange"
         elif results["overall_safety"] == "potentially_concerning":
-            ax2.set_title("Potentially Concerning - Slightly Blurred", color='darkgoldenrod')
+            title, title_style = "Potentially Concerning - Slightly Blurred", "color: darkgoldenrod"
         else:
-            ax2.set_title("No Issues Detected", color='green')
-        ax2.axis('off')
+            title, title_style = "No Issues Detected", "color: green"
     
-        plt.tight_layout()
-        plt.show()
+        display(HTML(f'<p>Original Image | <span style="{title_style}">{title}</span></p>'))
+        display(thumbnails)
     
         # Display text analysis
         display(HTML("<h3>Image Content Analysis Results</h3>"))
     
-        # Create a styled HTML table for results
-        css_style = """
-        <style>
-        .results-table {
-            border-collapse: collapse;
-            width: 100%;
-            margin-bottom: 20px;
-        }
-        .results-table th, .results-table td {
-            border: 1px solid #ddd;
-            padding: 8px;
-            text-align: left;
-        }
-        .results-table tr:nth-child(even) {
-            background-color: #f2f2f2;
-        }
-        .results-table th {
-            padding-top: 12px;
-            padding-bottom: 12px;
-            background-color: #4CAF50;
-            color: white;
-        }
-        .safe { color: green; font-weight: bold; }
-        .questionable { color: orange; font-weight: bold; }
-        .unsafe { color: red; font-weight: bold; }
-        .flag-item { margin: 5px 0; padding: 3px 8px; border-radius: 3px; display: inline-block; margin-right: 5px; }
-        .flag-adult { background-color: #ffcccc; }
-        .flag-violence { background-color: #ffaaaa; }
-        .flag-racy { background-color: #ffd8b1; }
-        .flag-text { background-color: #ffffcc; }
-        .flag-object { background-color: #e6ccff; }
-        </style>
-        """
-    
         # Determine safety class for styling
         safety_class = ""
         if results["overall_safety"] == "safe":
@@ -506,124 +861,54 @@ class ImageContentFilter:
         else:
             safety_class = "unsafe"
     
-        # Create HTML content
-        html_content = f"""
-        <table class="results-table">
-            <tr>
-                <th colspan="2">Overview</th>
-            </tr>
-            <tr>
-                <td>Source</td>
-                <td>{results["source"]}</td>
-            </tr>
-            <tr>
-                <td>Image Size</td>
-                <td>{results["image_size"]}</td>
-            </tr>
-            <tr>
-                <td>Overall Safety Rating</td>
-                <td class="{safety_class}">{results["overall_safety"].upper().replace("_", " ")}</td>
-            </tr>
-            <tr>
-                <td>Recommended Action</td>
-                <td class="{safety_class}">{results["suggested_action"].upper()}</td>
-            </tr>
-        """
+        # Overview table
+        html_parts = [_CSS, _OVERVIEW_TABLE.substitute(
+            source=results["source"],
+            image_size=results["image_size"],
+            safety_class=safety_class,
+            safety=results["overall_safety"].upper().replace("_", " "),
+            action=results["suggested_action"].upper()
+        )]
         
         # Add export path if available
         if "export_path" in results:
-            html_content += f"""
-            <tr>
-                <td>Side-by-Side Export</td>
-                <td>{results["export_path"]}</td>
-            </tr>
-            """
-            
-        html_content += "</table>"
-    
-        # Safe Search results
-        html_content += """
-        <table class="results-table">
-            <tr>
-                <th>Category</th>
-                <th>Rating</th>
-                <th>Confidence</th>
-            </tr>
-        """
+            html_parts.append(_EXPORT_ROW.substitute(export_path=results["export_path"]))
+        html_parts.append("</table>")
     
+        # Safe Search results, colored by score
+        html_parts.append(_SAFE_SEARCH_HEADER)
         for category, data in results["safe_search"].items():
             score = data["score"]
-            likelihood = data["likelihood"]
-        
-            # Determine cell color based on score
-            cell_class = ""
             if score >= 0.7:
                 cell_class = "unsafe"
             elif score >= 0.5:
                 cell_class = "questionable"
             else:
                 cell_class = "safe"
-            
-            html_content += f"""
-            <tr>
-                <td>{category.capitalize()}</td>
-                <td class="{cell_class}">{likelihood}</td>
-                <td>{score:.2f}</td>
-            </tr>
-            """
-    
-        html_content += "</table>"
+            html_parts.append(_SAFE_SEARCH_ROW.substitute(
+                category=category.capitalize(),
+                cell_class=cell_class,
+                likelihood=data["likelihood"],
+                score=f"{score:.2f}"
+            ))
+        html_parts.append("</table>")
     
         # Content flags
         if results["content_flags"]:
-            html_content += """
-            <table class="results-table">
-                <tr>
-                    <th>Content Flags</th>
-                </tr>
-                <tr>
-                    <td>
-            """
-        
+            html_parts.append(_FLAGS_HEADER)
             for flag in results["content_flags"]:
-                flag_class = ""
-                if flag == "adult":
-                    flag_class = "flag-adult"
-                elif flag == "violence":
-                    flag_class = "flag-violence"
-                elif flag == "racy":
-                    flag_class = "flag-racy"
-                elif "text" in flag:
-                    flag_class = "flag-text"
-                elif "object" in flag:
-                    flag_class = "flag-object"
-                
-                html_content += f'<span class="flag-item {flag_class}">{flag.replace("_", " ").replace(":", ": ")}</span>'
-        
-            html_content += """
-                    </td>
-                </tr>
-            </table>
-            """
+                html_parts.append(_FLAG_ITEM.substitute(
+                    flag_class=_flag_class(flag),
+                    flag=flag.replace("_", " ").replace(":", ": ")
+                ))
+            html_parts.append(_FLAGS_FOOTER)
     
         # Text content
         if results["text_content"]:
-            # Fix: Store the replacement result separately to avoid using \n in f-string
-            escaped_text = results["text_content"].replace("\n", "<br>")
-            
-            html_content += f"""
-            <table class="results-table">
-            <tr>
-                <th>Detected Text</th>
-            </tr>
-            <tr>
-                <td>{escaped_text}</td>
-            </tr>
-            </table>
-            """
-    
-        # Display the HTML (combine the style and content)
-        display(HTML(css_style + html_content))
+            html_parts.append(_TEXT_TABLE.substitute(text=results["text_content"].replace("\n", "<br>")))
+    
+        # Display the HTML (style and content)
+        display(HTML("".join(html_parts)))
     
         # Print labels in a compact way
         if results["labels"]:
@@ -671,8 +956,12 @@ def analyze_image_interactive():
             export = input("Export analysis results to JSON file? (y/n): ")
             if export.lower() == 'y':
                 output_file = f"content_filter_results_{results['overall_safety']}.json"
-                with open(output_file, 'w') as f:
-                    json.dump(results, f, indent=2)
+                if orjson is not None:
+                    with open(output_file, 'wb') as f:
+                        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+                else:
+                    with open(output_file, 'w') as f:
+                        json.dump(results, f, indent=2)
                 print(f"Analysis results exported to {output_file}")
                 
         except ValueError as e:
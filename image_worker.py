@@ -0,0 +1,32 @@
+"""
+Image analysis process pool entry points
+
+The backend hands these to its process pool by reference, so this module must
+stay free of heavy imports: image_content_filter (Vision, numpy, cv2, PIL) is
+only imported inside the worker processes.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+_worker_filter = None
+
+def _build_filter():
+    """Import image_content_filter and build this worker's ImageContentFilter"""
+    global _worker_filter
+    from image_content_filter import ImageContentFilter
+    _worker_filter = ImageContentFilter()
+
+def init_worker():
+    """Build the ImageContentFilter for this pool worker"""
+    try:
+        _build_filter()
+    except Exception as e:
+        # Retried on the first analysis so the error reaches the caller
+        logger.error(f"Error initializing image filter in worker: {str(e)}")
+
+def analyze_in_worker(**kwargs):
+    """Analyze an image with this pool worker's ImageContentFilter"""
+    if _worker_filter is None:
+        _build_filter()
+    return _worker_filter.analyze_image(**kwargs)